@@ -0,0 +1,19 @@
+import sys
+from datetime import datetime
+
+from curva_abcd_safras import SNAPSHOT_PATH, prepare_data
+
+def main(csv_path):
+    # Roda a mesma preparação do app sobre a base Master canônica e grava o
+    # resultado ao lado do app, para ser publicado junto no deploy. Usa a versão
+    # sem cache, para nunca reaproveitar um snapshot de código antigo
+    df_agg = prepare_data(csv_path)
+    # Data de geração vai nos metadados do parquet (df.attrs), lida de volta pelo app
+    df_agg.attrs['gerado_em'] = datetime.now().isoformat(timespec='seconds')
+    df_agg.to_parquet(SNAPSHOT_PATH, index=False)
+    print(f"{len(df_agg)} consultores gravados em {SNAPSHOT_PATH}")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        sys.exit("Uso: python build_cache.py <base_master.csv>")
+    main(sys.argv[1])
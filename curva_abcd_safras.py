@@ -1,35 +1,128 @@
+import hashlib
+import os
+import tempfile
+from datetime import datetime
+
 import streamlit as st
+import numpy as np
 import pandas as pd
-import plotly.express as px
 
-# Configuração da página
-st.set_page_config(page_title="Análise de Safras - Portfel", layout="wide")
+# Acima desse número de barras o contorno preto é removido: com muitas safras ele
+# pesa no desenho SVG do navegador e já não ajuda na leitura
+MAX_BARRAS_COM_CONTORNO = 60
 
-@st.cache_data
-def load_and_prepare_data(uploaded_file):
-    # Carrega a base a partir do arquivo upado pelo usuário
-    df = pd.read_csv(uploaded_file)
-    df['Data'] = pd.to_datetime(df['Data'], errors='coerce')
-    
-    # Ordena cronologicamente para consistência
-    df = df.sort_values(by=['E-mail', 'Data'])
-    
-    # Agregação para consolidar o "perfil final" de cada consultor
-    df_agg = df.groupby('E-mail').agg({
-        'Turma': 'first',
-        'MF': lambda x: 'Sim' if 'Sim' in x.values else 'Não',
-        # min() alfabético: 'A' é menor que 'B', logo traz a curva mais alta atingida
-        'Curva AuC': 'min', 
-        'Curva Receita do Consultor': 'min', # NOVO: Captura o ápice da Receita
-        'Status': lambda x: 'Desligado' if 'Desligado' in x.values else 'Ativo'
-    }).reset_index()
-    
-    # Renomeando as categorias do MF para melhorar o UX
+# Snapshot da base Master já agregada, gerado no deploy por build_cache.py
+SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'df_agg.parquet')
+
+# Versão do cache em disco de load_and_prepare_data: incremente sempre que a
+# preparação dos dados mudar, para não servir snapshots gerados por código antigo
+CACHE_VERSION = 3
+
+# Quantas bases diferentes ficam no cache em disco; as usadas há mais tempo saem
+MAX_ARQUIVOS_CACHE = 20
+
+def group_min_codes(codes, ordem, cortes):
+    # Mínimo por grupo sobre os códigos int8 de uma categoria ordenada, com as linhas
+    # já agrupadas em blocos contíguos (código -1 = valor ausente, ignorado como no
+    # min() do pandas)
+    sentinela = np.iinfo(np.int8).max
+    codes = np.where(codes < 0, sentinela, codes).astype(np.int8)
+    out = np.minimum.reduceat(codes[ordem], cortes)
+    out[out == sentinela] = -1
+    return out
+
+def prune_disk_cache(cache_dir):
+    # Remove os snapshots de versões anteriores do cache (e .tmp órfãos delas) e,
+    # da versão atual, mantém só os mais recentes, abrindo espaço para o que vai
+    # ser gravado. Os .tmp da versão atual podem ser gravações em andamento
+    atual = f"curva_cache_v{CACHE_VERSION}_"
+    remover, vigentes = [], []
+    for nome in os.listdir(cache_dir):
+        caminho = os.path.join(cache_dir, nome)
+        if nome.startswith('curva_cache_') and not nome.startswith(atual):
+            remover.append(caminho)
+        elif nome.startswith(atual) and nome.endswith('.parquet'):
+            try:
+                vigentes.append((os.path.getmtime(caminho), caminho))
+            except OSError:
+                pass
+    vigentes.sort(reverse=True)
+    remover += [caminho for _, caminho in vigentes[MAX_ARQUIVOS_CACHE - 1:]]
+    for caminho in remover:
+        try:
+            os.remove(caminho)
+        except OSError:
+            pass
+
+def prepare_data(csv_file):
+    # Leitura e agregação da base Master, sem nenhum cache: usado pelo app e pelo
+    # build_cache.py, para o snapshot de deploy sair sempre do código atual.
+    # Carrega a base já com tipos enxutos (parser do pyarrow: multi-thread e sem
+    # criar objetos Python por célula)
+    curva_dtype = pd.CategoricalDtype(['A', 'B', 'C', 'D'], ordered=True)
+    df = pd.read_csv(
+        csv_file,
+        engine='pyarrow',
+        dtype={
+            'MF': 'category',
+            'Status': 'category',
+            'Curva AuC': curva_dtype,
+            'Curva Receita do Consultor': curva_dtype,
+            'Turma': 'Int16'
+        },
+        parse_dates=['Data']
+    )
+    # Se alguma data não for reconhecida o parser devolve a coluna inteira como texto;
+    # nesse caso converte aqui, com os valores inválidos virando NaT como antes
+    if not pd.api.types.is_datetime64_any_dtype(df['Data']):
+        df['Data'] = pd.to_datetime(df['Data'], errors='coerce')
+
+    # Turma da primeira aparição cronológica de cada consultor, sem ordenar a base
+    # inteira (datas inválidas ficam por último e linhas sem Turma são ignoradas,
+    # como no antigo sort_values + 'first')
+    com_turma = df[df['Turma'].notna()]
+    data_ordem = com_turma['Data'].fillna(pd.Timestamp.max)
+    idx_primeira = data_ordem.groupby(com_turma['E-mail'], sort=False).idxmin()
+    turma_por_email = df.loc[idx_primeira].set_index('E-mail')['Turma']
+
+    # Agrupa as linhas de cada consultor em blocos contíguos (códigos do e-mail em
+    # ordem estável); cada redução vira um único reduceat do NumPy sobre os blocos
+    email_codes, emails = pd.factorize(df['E-mail'], sort=False)
+    linhas = np.flatnonzero(email_codes >= 0)
+    ordem = linhas[np.argsort(email_codes[linhas], kind='stable')]
+    cortes = np.flatnonzero(np.diff(email_codes[ordem], prepend=-1))
+
+    # Agregação para consolidar o "perfil final" de cada consultor:
+    # - "tem algum 'Sim'/'Desligado'?" é um OR das flags booleanas
+    # - curvas: min() sobre os códigos da categoria A-D. 'A' é o menor código,
+    #   logo traz a curva mais alta atingida (AuC e Receita)
+    # O e-mail só serve de chave aqui: sai do resultado, que é gravado em disco
+    # (snapshot de deploy e cache) e não precisa carregar dado pessoal
+    df_agg = pd.DataFrame({
+        '_is_mf': np.logical_or.reduceat(df['MF'].eq('Sim').to_numpy()[ordem], cortes),
+        '_is_desl': np.logical_or.reduceat(df['Status'].eq('Desligado').to_numpy()[ordem], cortes),
+        **{
+            col: pd.Categorical.from_codes(
+                group_min_codes(df[col].cat.codes.to_numpy(), ordem, cortes),
+                dtype=curva_dtype
+            )
+            for col in ['Curva AuC', 'Curva Receita do Consultor']
+        }
+    }, index=pd.Index(emails, name='E-mail')).join(turma_por_email.rename('Turma')).reset_index(drop=True)
+    
+    # Traduzindo as flags para os rótulos exibidos (MF com nomes melhores para o UX)
     mf_map = {
         'Sim': 'Profissionais de mercado financeiro (MF)',
         'Não': 'Profissionais em migração de carreira'
     }
-    df_agg['MF'] = df_agg['MF'].map(mf_map)
+    df_agg['MF'] = pd.Categorical(
+        np.where(df_agg.pop('_is_mf'), mf_map['Sim'], mf_map['Não']),
+        categories=list(mf_map.values())
+    )
+    df_agg['Status'] = pd.Categorical(
+        np.where(df_agg.pop('_is_desl'), 'Desligado', 'Ativo'),
+        categories=['Desligado', 'Ativo']
+    )
     
     # Renomeando as colunas de curva para padronizar
     df_agg = df_agg.rename(columns={
@@ -38,22 +131,212 @@ def load_and_prepare_data(uploaded_file):
     })
     return df_agg
 
-def main():
+@st.cache_data
+def load_and_prepare_data(uploaded_file):
+    # Snapshot em parquet por hash do conteúdo: o mesmo arquivo, em outra sessão
+    # ou após um refresh, não precisa ser reprocessado
+    h = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+    cache_dir = tempfile.gettempdir()
+    cache_path = os.path.join(cache_dir, f"curva_cache_v{CACHE_VERSION}_{h}.parquet")
+    if os.path.exists(cache_path):
+        # Arquivo corrompido ou apagado no meio do caminho: só reprocessa a base
+        try:
+            df_agg = pd.read_parquet(cache_path)
+            os.utime(cache_path)
+            return df_agg
+        except Exception:
+            pass
+    
+    df_agg = prepare_data(uploaded_file)
+    
+    # Grava em arquivo temporário e renomeia, para outra sessão nunca ler um parquet
+    # pela metade. O cache é só otimização: disco cheio ou diretório somente leitura
+    # não podem virar erro de "CSV inválido". O mkstemp cria o arquivo com permissão
+    # 0600, que o os.replace preserva: outros usuários da máquina não leem a base
+    try:
+        prune_disk_cache(cache_dir)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, prefix=f"curva_cache_v{CACHE_VERSION}_", suffix='.tmp')
+        os.close(fd)
+        try:
+            df_agg.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            os.remove(tmp_path)
+            raise
+    except OSError:
+        pass
+    return df_agg
+
+@st.cache_data
+def load_snapshot(path):
+    return pd.read_parquet(path)
+
+@st.cache_data
+def precompute_aggregates(df_agg, visao_geral=False):
+    # Contagens da base inteira por (Turma, MF[, Curva]); os filtros da sidebar
+    # passam a recortar essas tabelas pequenas em vez de reagrupar a base.
+    # dropna=False mantém quem não tem Turma ou curva válida: a visão geral
+    # continua contando todos os consultores e os totais não mudam.
+    # Na visão geral a Turma fica fora das chaves e o rótulo "Geral" é
+    # preenchido depois, sem copiar a base só para sobrescrever a coluna
+    chaves = ['MF'] if visao_geral else ['Turma', 'MF']
+    desligados = df_agg[df_agg['Status'] == 'Desligado']
+    
+    # Como as contagens já incluem quem não tem curva válida, os totais por
+    # (Turma, MF) saem da própria tabela pequena, sem nova passada na base
+    auc_counts = df_agg.groupby(chaves + ['Curva AuC Máxima'], observed=True, sort=False, dropna=False).size()
+    rec_counts = df_agg.groupby(chaves + ['Curva Receita Máxima'], observed=True, sort=False, dropna=False).size()
+    mf_totals = auc_counts.groupby(level=chaves, observed=True, sort=False, dropna=False).sum()
+    
+    aggs = {
+        'auc_counts': auc_counts.reset_index(name='Contagem'),
+        'rec_counts': rec_counts.reset_index(name='Contagem'),
+        'mf_totals': mf_totals.reset_index(name='Total'),
+        'deslig_counts': desligados.groupby(chaves, observed=True, sort=False, dropna=False).size().reset_index(name='Desligados')
+    }
+    if visao_geral:
+        for tabela in aggs.values():
+            tabela.insert(0, 'Turma', "Geral")
+    return aggs
+
+@st.cache_data(max_entries=32)
+def build_curva_fig(df_pct, curva_col, ordem_x, eixo_x_titulo):
+    # Plotly só é importado quando há gráfico a desenhar: a tela inicial (aguardando
+    # upload) não paga o custo do import
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    
+    # Figuras ficam em cache por (tabela, seleção): reruns com a mesma seleção
+    # reaproveitam a figura já montada. cache_data entrega uma cópia por sessão e
+    # max_entries limita quantas seleções ficam guardadas em memória
+    
+    # Cor base para as curvas ABCD
+    cores_curvas = {'A': '#2ca02c', 'B': '#1f77b4', 'C': '#ff7f0e', 'D': '#d62728'}
+    
+    mf_ordem = ["Profissionais de mercado financeiro (MF)", "Profissionais em migração de carreira"]
+    
+    # A tabela já vem agregada por (Turma, MF, Curva): um go.Bar por curva em cada
+    # subplot de MF, sem o reagrupamento interno do plotly.express
+    fig = make_subplots(
+        rows=1, cols=2, 
+        shared_yaxes=True, 
+        horizontal_spacing=0.03,
+        subplot_titles=[f"<b>{mf}</b>" for mf in mf_ordem]
+    )
+    for col, mf in enumerate(mf_ordem, start=1):
+        df_mf = df_pct[df_pct['MF'] == mf]
+        for curva, cor in cores_curvas.items():
+            df_curva = df_mf[df_mf[curva_col] == curva]
+            fig.add_trace(
+                go.Bar(
+                    x=df_curva['Turma'],
+                    y=df_curva['Percentual (%)'],
+                    text=df_curva['Percentual (%)'],
+                    name=curva,
+                    legendgroup=curva,
+                    showlegend=(col == 1),
+                    marker_color=cor
+                ),
+                row=1, col=col
+            )
+    
+    # uirevision fixo: mexer na sidebar não força o navegador a recalcular o layout
+    fig.update_layout(barmode='stack', template="plotly_white", height=500, legend_title_text=curva_col, uirevision='constant')
+    fig.update_annotations(font=dict(size=14))
+    contorno = 0.5 if len(df_pct) <= MAX_BARRAS_COM_CONTORNO else 0
+    fig.update_traces(texttemplate='%{text}%', textposition='inside', textfont_size=12, marker_line_color='black', marker_line_width=contorno)
+    fig.update_yaxes(title_text="Percentual (%)", showgrid=True, gridcolor='lightgray')
+    # Os Turma chegam como texto numérico: sem type='category' o Plotly trata o eixo
+    # como linear e ignora a ordem; matches='x' mantém os dois painéis alinhados
+    fig.update_xaxes(
+        title_text=eixo_x_titulo, type='category', matches='x',
+        categoryorder='array', categoryarray=list(ordem_x)
+    )
+    return fig
+
+@st.cache_data(max_entries=32)
+def build_deslig_fig(df_deslig_pct, ordem_x, eixo_x_titulo):
+    import plotly.graph_objects as go
+    
+    cores_mf = {
+        'Profissionais de mercado financeiro (MF)': '#1f77b4', 
+        'Profissionais em migração de carreira': '#ff7f0e'
+    }
+    
+    fig = go.Figure()
+    for mf, cor in cores_mf.items():
+        df_mf = df_deslig_pct[df_deslig_pct['MF'] == mf]
+        fig.add_trace(go.Bar(
+            x=df_mf['Turma'],
+            y=df_mf['Taxa de Desligamento (%)'],
+            text=df_mf['Taxa de Desligamento (%)'],
+            name=mf,
+            marker_color=cor
+        ))
+    
+    fig.update_traces(
+        texttemplate='%{text}%', 
+        textposition='outside',
+        textfont_size=12,
+        marker_line_color='black',
+        marker_line_width=0.5 if len(df_deslig_pct) <= MAX_BARRAS_COM_CONTORNO else 0
+    )
+    
+    fig.update_layout(
+        yaxis_title="Percentual Desligado (%)", 
+        xaxis_title=eixo_x_titulo, 
+        xaxis=dict(type='category', categoryorder='array', categoryarray=list(ordem_x)),
+        yaxis=dict(range=[0, 115], showgrid=True, gridcolor='lightgray'),
+        barmode='group',
+        template="plotly_white",
+        height=550,
+        uirevision='constant',
+        legend_title_text="",
+        legend=dict(
+            orientation="h", 
+            yanchor="bottom", 
+            y=1.02, 
+            xanchor="center", 
+            x=0.5
+        )
+    )
+    return fig
+
+def main(show_receita=True, macro_groups=True):
+    # Versão única do painel; as variantes antigas (sem a análise de Receita ou sem
+    # os grupos macro de turmas na sidebar) saem destes dois parâmetros
     st.title("📊 Análise de Safras (Cohorts) - Consultores")
-    st.markdown("Faça o upload da base unificada (Master) para visualizar o desempenho (AuC e Receita) e a retenção.")
     
-    # Widget para upload do arquivo CSV
-    uploaded_file = st.file_uploader("Suba o arquivo CSV atualizado", type=['csv'])
+    # Com o snapshot publicado no deploy, o upload só é necessário para uma base nova
+    tem_snapshot = os.path.exists(SNAPSHOT_PATH)
+    if tem_snapshot:
+        st.markdown("Desempenho (AuC e Receita) e retenção dos consultores a partir da base unificada (Master). Para analisar uma base mais recente, suba o CSV atualizado.")
+    else:
+        st.markdown("Faça o upload da base unificada (Master) para visualizar o desempenho (AuC e Receita) e a retenção.")
     
-    if uploaded_file is None:
-        st.info("Aguardando o upload do arquivo CSV para iniciar a análise.")
-        return
+    if tem_snapshot and not st.checkbox("Subir uma base nova (CSV)"):
+        df = load_snapshot(SNAPSHOT_PATH)
+        # A data de geração vem gravada no próprio parquet por build_cache.py (o mtime
+        # do arquivo é o do checkout do deploy, não o da geração)
+        gerado_em = df.attrs.get('gerado_em')
+        if gerado_em:
+            data_snapshot = datetime.fromisoformat(gerado_em).strftime('%d/%m/%Y %H:%M')
+            st.caption(f"Usando a base Master pré-processada publicada com o app (gerada em {data_snapshot}).")
+        else:
+            st.caption("Usando a base Master pré-processada publicada com o app.")
+    else:
+        # Widget para upload do arquivo CSV
+        uploaded_file = st.file_uploader("Suba o arquivo CSV atualizado", type=['csv'])
+        
+        if uploaded_file is None:
+            st.info("Aguardando o upload do arquivo CSV para iniciar a análise.")
+            return
 
-    try:
-        df = load_and_prepare_data(uploaded_file)
-    except Exception as e:
-        st.error(f"Erro ao processar os dados. Verifique se o formato do CSV está correto. Detalhe: {e}")
-        return
+        try:
+            df = load_and_prepare_data(uploaded_file)
+        except Exception as e:
+            st.error(f"Erro ao processar os dados. Verifique se o formato do CSV está correto. Detalhe: {e}")
+            return
 
     st.sidebar.header("Filtros de Análise")
     
@@ -65,13 +348,14 @@ def main():
     
     if visao == "Visão Por Safra":
         turmas_disponiveis = sorted(df['Turma'].dropna().unique().tolist())
+        turmas_arr = np.asarray(turmas_disponiveis, dtype=np.int16)
         
         # Opções de UX macro
         opcoes_especiais = [
             "Selecionar todas", 
             "Dados - FCE (Finclass)", 
             "Dados - Sem FCE (Finclass)"
-        ]
+        ] if macro_groups else []
         
         # Pega as 5 turmas mais recentes (maiores números)
         cinco_mais_recentes = turmas_disponiveis[-5:] if len(turmas_disponiveis) >= 5 else turmas_disponiveis
@@ -93,116 +377,76 @@ def main():
             if item == "Selecionar todas":
                 turmas_selecionadas_set.update(turmas_disponiveis)
             elif item == "Dados - FCE (Finclass)":
-                turmas_selecionadas_set.update([t for t in turmas_disponiveis if t >= 24])
+                turmas_selecionadas_set.update(turmas_arr[turmas_arr >= 24].tolist())
             elif item == "Dados - Sem FCE (Finclass)":
-                turmas_selecionadas_set.update([t for t in turmas_disponiveis if t < 24])
+                turmas_selecionadas_set.update(turmas_arr[turmas_arr < 24].tolist())
             else:
                 turmas_selecionadas_set.add(item)
         
         turmas_selecionadas = sorted(list(turmas_selecionadas_set))
         
-        df_filtered = df[df['Turma'].isin(turmas_selecionadas)].copy()
+        aggs = precompute_aggregates(df)
+        aggs = {nome: tabela[tabela['Turma'].isin(turmas_selecionadas)] for nome, tabela in aggs.items()}
         ordem_x = [str(t) for t in turmas_selecionadas]
         eixo_x_titulo = "Turma (Safra)"
         
     else:
         # VISÃO GERAL
-        df_filtered = df.copy()
-        df_filtered['Turma'] = "Geral"
+        aggs = precompute_aggregates(df, visao_geral=True)
         ordem_x = ["Geral"]
         eixo_x_titulo = "Visão Consolidada"
     
-    # Cor base para as curvas ABCD
-    cores_curvas = {'A': '#2ca02c', 'B': '#1f77b4', 'C': '#ff7f0e', 'D': '#d62728'}
-    
     # =========================================================================
     # ANÁLISE 1: ÁPICE DA CURVA AuC (MF vs Não-MF)
     # =========================================================================
     st.header("1. Ápice da Curva AuC")
     st.markdown("Percentual de atingimento das curvas A, B, C e D em seu melhor momento (AuC), segmentado pelo background do consultor.")
     
-    df_auc_contagem = df_filtered.groupby(['Turma', 'MF', 'Curva AuC Máxima']).size().reset_index(name='Contagem')
-    df_total = df_filtered.groupby(['Turma', 'MF']).size().reset_index(name='Total')
-    df_auc_pct = pd.merge(df_auc_contagem, df_total, on=['Turma', 'MF'])
+    df_auc_contagem = aggs['auc_counts']
+    df_total = aggs['mf_totals']
     
-    df_auc_pct['Percentual (%)'] = (df_auc_pct['Contagem'] / df_auc_pct['Total']) * 100
-    df_auc_pct['Percentual (%)'] = df_auc_pct['Percentual (%)'].round(1) 
+    # Percentual dentro de cada (Turma, MF) direto das contagens, sem merge com os totais
+    df_auc_pct = df_auc_contagem.copy()
+    df_auc_pct['Percentual (%)'] = df_auc_pct['Contagem'].div(
+        df_auc_pct.groupby(['Turma', 'MF'], observed=True, sort=False)['Contagem'].transform('sum')
+    ).mul(100).round(1)
     df_auc_pct['Turma'] = df_auc_pct['Turma'].astype(str) 
+    df_auc_pct = df_auc_pct[df_auc_pct['Curva AuC Máxima'].notna()]
     
-    fig_auc = px.bar(
-        df_auc_pct, 
-        x='Turma', 
-        y='Percentual (%)', 
-        color='Curva AuC Máxima',
-        facet_col='MF', 
-        barmode='stack',
-        text='Percentual (%)',
-        color_discrete_map=cores_curvas,
-        category_orders={
-            "Curva AuC Máxima": ["A", "B", "C", "D"], 
-            "Turma": ordem_x,
-            "MF": ["Profissionais de mercado financeiro (MF)", "Profissionais em migração de carreira"]
-        },
-        template="plotly_white",
-        height=500
-    )
-    
-    fig_auc.for_each_annotation(lambda a: a.update(text=f"<b>{a.text.split('=')[-1]}</b>", font=dict(size=14)))
-    fig_auc.update_traces(texttemplate='%{text}%', textposition='inside', textfont_size=12, marker_line_color='black', marker_line_width=0.5)
-    fig_auc.update_yaxes(title_text="Percentual (%)", showgrid=True, gridcolor='lightgray')
-    fig_auc.update_xaxes(title_text=eixo_x_titulo)
+    fig_auc = build_curva_fig(df_auc_pct, 'Curva AuC Máxima', tuple(ordem_x), eixo_x_titulo)
     
     st.plotly_chart(fig_auc, use_container_width=True)
     
     st.divider()
 
-    # =========================================================================
-    # ANÁLISE 2: ÁPICE DA CURVA RECEITA (MF vs Não-MF)
-    # =========================================================================
-    st.header("2. Ápice da Curva de Receita")
-    st.markdown("Percentual de atingimento das curvas A, B, C e D em seu melhor momento (Receita), segmentado pelo background do consultor.")
-    
-    df_receita_contagem = df_filtered.groupby(['Turma', 'MF', 'Curva Receita Máxima']).size().reset_index(name='Contagem')
-    df_receita_pct = pd.merge(df_receita_contagem, df_total, on=['Turma', 'MF'])
-    
-    df_receita_pct['Percentual (%)'] = (df_receita_pct['Contagem'] / df_receita_pct['Total']) * 100
-    df_receita_pct['Percentual (%)'] = df_receita_pct['Percentual (%)'].round(1) 
-    df_receita_pct['Turma'] = df_receita_pct['Turma'].astype(str) 
-    
-    fig_rec = px.bar(
-        df_receita_pct, 
-        x='Turma', 
-        y='Percentual (%)', 
-        color='Curva Receita Máxima',
-        facet_col='MF', 
-        barmode='stack',
-        text='Percentual (%)',
-        color_discrete_map=cores_curvas,
-        category_orders={
-            "Curva Receita Máxima": ["A", "B", "C", "D"], 
-            "Turma": ordem_x,
-            "MF": ["Profissionais de mercado financeiro (MF)", "Profissionais em migração de carreira"]
-        },
-        template="plotly_white",
-        height=500
-    )
+    if show_receita:
+        # =========================================================================
+        # ANÁLISE 2: ÁPICE DA CURVA RECEITA (MF vs Não-MF)
+        # =========================================================================
+        st.header("2. Ápice da Curva de Receita")
+        st.markdown("Percentual de atingimento das curvas A, B, C e D em seu melhor momento (Receita), segmentado pelo background do consultor.")
     
-    fig_rec.for_each_annotation(lambda a: a.update(text=f"<b>{a.text.split('=')[-1]}</b>", font=dict(size=14)))
-    fig_rec.update_traces(texttemplate='%{text}%', textposition='inside', textfont_size=12, marker_line_color='black', marker_line_width=0.5)
-    fig_rec.update_yaxes(title_text="Percentual (%)", showgrid=True, gridcolor='lightgray')
-    fig_rec.update_xaxes(title_text=eixo_x_titulo)
+        df_receita_contagem = aggs['rec_counts']
+        df_receita_pct = df_receita_contagem.copy()
+        df_receita_pct['Percentual (%)'] = df_receita_pct['Contagem'].div(
+            df_receita_pct.groupby(['Turma', 'MF'], observed=True, sort=False)['Contagem'].transform('sum')
+        ).mul(100).round(1)
+        df_receita_pct['Turma'] = df_receita_pct['Turma'].astype(str) 
+        df_receita_pct = df_receita_pct[df_receita_pct['Curva Receita Máxima'].notna()]
     
-    st.plotly_chart(fig_rec, use_container_width=True)
+        fig_rec = build_curva_fig(df_receita_pct, 'Curva Receita Máxima', tuple(ordem_x), eixo_x_titulo)
     
-    st.divider()
+        st.plotly_chart(fig_rec, use_container_width=True)
+    
+        st.divider()
 
     # =========================================================================
     # ANÁLISE 3: DESLIGAMENTOS (MF vs Não-MF)
     # =========================================================================
-    st.header("3. Percentual de Desligamentos (Churn)")
+    st.header(f"{3 if show_receita else 2}. Percentual de Desligamentos (Churn)")
     st.markdown("Taxa de evasão de consultores, comparando os diferentes backgrounds profissionais.")
     
-    df_desligados = df_filtered[df_filtered['Status'] == 'Desligado'].groupby(['Turma', 'MF']).size().reset_index(name='Desligados')
+    df_desligados = aggs['deslig_counts']
     df_deslig_pct = pd.merge(df_total, df_desligados, on=['Turma', 'MF'], how='left')
     df_deslig_pct['Desligados'] = df_deslig_pct['Desligados'].fillna(0)
     
@@ -210,48 +454,11 @@ def main():
     df_deslig_pct['Taxa de Desligamento (%)'] = df_deslig_pct['Taxa de Desligamento (%)'].round(1)
     df_deslig_pct['Turma'] = df_deslig_pct['Turma'].astype(str)
     
-    fig_deslig = px.bar(
-        df_deslig_pct,
-        x='Turma',
-        y='Taxa de Desligamento (%)',
-        color='MF',
-        barmode='group',
-        text='Taxa de Desligamento (%)',
-        color_discrete_map={
-            'Profissionais de mercado financeiro (MF)': '#1f77b4', 
-            'Profissionais em migração de carreira': '#ff7f0e'
-        },
-        category_orders={
-            'Turma': ordem_x,
-            'MF': ["Profissionais de mercado financeiro (MF)", "Profissionais em migração de carreira"]
-        },
-        template="plotly_white",
-        height=550
-    )
-    
-    fig_deslig.update_traces(
-        texttemplate='%{text}%', 
-        textposition='outside',
-        textfont_size=12,
-        marker_line_color='black',
-        marker_line_width=0.5
-    )
-    
-    fig_deslig.update_layout(
-        yaxis_title="Percentual Desligado (%)", 
-        xaxis_title=eixo_x_titulo, 
-        yaxis=dict(range=[0, 115], showgrid=True, gridcolor='lightgray'),
-        legend_title_text="",
-        legend=dict(
-            orientation="h", 
-            yanchor="bottom", 
-            y=1.02, 
-            xanchor="center", 
-            x=0.5
-        )
-    )
+    fig_deslig = build_deslig_fig(df_deslig_pct, tuple(ordem_x), eixo_x_titulo)
     
     st.plotly_chart(fig_deslig, use_container_width=True)
 
 if __name__ == "__main__":
+    # Configuração da página
+    st.set_page_config(page_title="Análise de Safras - Portfel", layout="wide")
     main()